@@ -0,0 +1,208 @@
+import argparse
+import csv
+import json
+import logging
+import os
+
+from save_codec import SaveFormatError, decode_save, encode_save, validate_attribute, write_save
+
+logger = logging.getLogger(__name__)
+
+CSV_FIELDS = ["index", "id", "attribute", "value"]
+
+
+class PlayerStateImportError(ValueError):
+    """Raised when an exported PLAYER_STATE file does not match the loaded save."""
+
+
+def _node_attributes(node):
+    return {attr: value for attr, value in node.attrib.items() if attr != "id"}
+
+
+def _is_csv(path):
+    return os.path.splitext(path)[1].lower() == ".csv"
+
+
+def iter_player_state(player_state):
+    """Yield (index, id, attributes) for every PLAYER_STATE node, in document order."""
+    for index, node in enumerate(player_state.findall('node')):
+        yield index, node.attrib.get("id", ""), _node_attributes(node)
+
+
+def write_ndjson(player_state, fp):
+    """Write one JSON object per PLAYER_STATE node."""
+    count = 0
+    for index, node_id, attributes in iter_player_state(player_state):
+        fp.write(json.dumps({"index": index, "id": node_id, "attributes": attributes}) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(player_state, fp):
+    """Write one CSV row per node attribute; attribute-less nodes get a single row with an empty attribute."""
+    writer = csv.writer(fp)
+    writer.writerow(CSV_FIELDS)
+    count = 0
+    for index, node_id, attributes in iter_player_state(player_state):
+        if not attributes:
+            writer.writerow([index, node_id, "", ""])
+        for attr, value in attributes.items():
+            writer.writerow([index, node_id, attr, value])
+        count += 1
+    return count
+
+
+def read_ndjson(fp):
+    """Yield (index, id, attributes) from an NDJSON export, one line at a time."""
+    for line_number, line in enumerate(fp, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            index, node_id, attributes = record["index"], record["id"], record["attributes"]
+        except (ValueError, KeyError, TypeError) as e:
+            raise PlayerStateImportError(f"Invalid record on line {line_number}: {e}") from e
+        if type(index) is not int:
+            raise PlayerStateImportError(f"Index on line {line_number} must be an integer, got {index!r}")
+        if not isinstance(node_id, str):
+            raise PlayerStateImportError(f"Id on line {line_number} must be a string, got {node_id!r}")
+        if not isinstance(attributes, dict):
+            raise PlayerStateImportError(f"Attributes on line {line_number} must be an object.")
+        for attr, value in attributes.items():
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise PlayerStateImportError(f"Invalid value for {node_id}.{attr} on line {line_number}: {value!r}")
+        yield index, node_id, {attr: str(value) for attr, value in attributes.items()}
+
+
+def read_csv(fp):
+    """Yield (index, id, attributes) from a CSV export, in index order.
+
+    Rows are grouped by index across the whole file, so a sheet that was sorted
+    or filtered in a spreadsheet still yields one record per node.
+    """
+    reader = csv.DictReader(fp)
+    if reader.fieldnames is None or any(field not in reader.fieldnames for field in CSV_FIELDS):
+        raise PlayerStateImportError(f"CSV header must contain: {', '.join(CSV_FIELDS)}")
+
+    nodes = {}
+    for row in reader:
+        # DictReader fills columns missing from a short row with None
+        if any(row[field] is None for field in CSV_FIELDS):
+            raise PlayerStateImportError(f"CSV line {reader.line_num} is missing columns; expected {', '.join(CSV_FIELDS)}")
+        try:
+            index = int(row["index"])
+        except ValueError as e:
+            raise PlayerStateImportError(f"Invalid index on CSV line {reader.line_num}: {row['index']!r}") from e
+        node_id, attributes = nodes.setdefault(index, (row["id"], {}))
+        if node_id != row["id"]:
+            raise PlayerStateImportError(f"Conflicting ids for index {index} on CSV line {reader.line_num}")
+        attr = row["attribute"]
+        if attr:
+            if attr in attributes:
+                raise PlayerStateImportError(f"Duplicate attribute {node_id}.{attr} on CSV line {reader.line_num}")
+            attributes[attr] = row["value"]
+    for index in sorted(nodes):
+        yield (index,) + nodes[index]
+
+
+def apply_player_state(player_state, records, validate=None):
+    """Update PLAYER_STATE nodes from (index, id, attributes) records.
+
+    Nodes missing from the records are left alone. Only nodes whose attributes
+    differ are rewritten, and nothing is changed unless every record matches
+    the loaded save. Each index may appear once. validate(node_id, attributes)
+    is called for every changed node and may raise PlayerStateImportError to
+    reject the import. Returns the ids of the changed nodes.
+    """
+    nodes = player_state.findall('node')
+    pending = []
+    seen = set()
+    for index, node_id, attributes in records:
+        if index in seen:
+            raise PlayerStateImportError(f"Node index {index} appears more than once.")
+        seen.add(index)
+        if index < 0 or index >= len(nodes):
+            raise PlayerStateImportError(f"Node index {index} is out of range (PLAYER_STATE has {len(nodes)} nodes).")
+        node = nodes[index]
+        if node.attrib.get("id", "") != node_id:
+            raise PlayerStateImportError(f"Node {index} is '{node.attrib.get('id', '')}' in the save, not '{node_id}'.")
+        if "id" in attributes:
+            raise PlayerStateImportError(f"Cannot change the id of {node_id}.")
+        current = _node_attributes(node)
+        for attr, value in attributes.items():
+            # Attributes already in the save are left as the game wrote them
+            if current.get(attr) == value:
+                continue
+            try:
+                validate_attribute(attr, value)
+            except SaveFormatError as e:
+                raise PlayerStateImportError(f"{node_id}: {e}") from e
+        if attributes != current:
+            if validate is not None:
+                validate(node_id, attributes)
+            pending.append((node, attributes))
+
+    for node, attributes in pending:
+        node_id = node.attrib.get("id")
+        node.attrib.clear()
+        if node_id is not None:
+            node.attrib["id"] = node_id
+        node.attrib.update(attributes)
+    changed = [node.attrib.get("id", "") for node, _ in pending]
+    logger.info(f"Imported PLAYER_STATE changes for {len(changed)} node(s)")
+    return changed
+
+
+def export_player_state(player_state, path):
+    """Export PLAYER_STATE to path as CSV (.csv) or newline-delimited JSON (anything else)."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        count = write_csv(player_state, f) if _is_csv(path) else write_ndjson(player_state, f)
+    logger.info(f"Exported {count} PLAYER_STATE node(s) to {path}")
+    return count
+
+
+def import_player_state(player_state, path, validate=None):
+    """Import a CSV (.csv) or newline-delimited JSON export into PLAYER_STATE."""
+    # utf-8-sig also accepts the byte order mark Excel writes to "CSV UTF-8" files
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        return apply_player_state(player_state, read_csv(f) if _is_csv(path) else read_ndjson(f), validate)
+
+
+def _load_player_state(save_path):
+    with open(save_path, 'rb') as f:
+        parsed = decode_save(f.read())
+    player_state = parsed.player_state()
+    if player_state is None:
+        raise SaveFormatError("PLAYER_STATE array not found in save file XML.")
+    return parsed, player_state
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export or import DYSMANTLE PLAYER_STATE data as CSV or NDJSON.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write PLAYER_STATE to a .csv or .ndjson file")
+    export_parser.add_argument("save", help=".save file to read")
+    export_parser.add_argument("output", help="Destination .csv or .ndjson file")
+    import_parser = subparsers.add_parser("import", help="Apply a .csv or .ndjson export to a save")
+    import_parser.add_argument("save", help=".save file to update")
+    import_parser.add_argument("input", help="Edited .csv or .ndjson file")
+    import_parser.add_argument("--output", help="Write to this file instead of overwriting the save")
+    import_parser.add_argument("--backup-dir", default="backups", help="Folder for backups made before overwriting")
+    args = parser.parse_args()
+
+    try:
+        parsed, player_state = _load_player_state(args.save)
+        if args.command == "export":
+            export_player_state(player_state, args.output)
+        else:
+            changed = import_player_state(player_state, args.input)
+            if not changed:
+                logger.info("No changes to save.")
+            else:
+                new_save_data = encode_save(parsed)
+                save_path = args.output or args.save
+                write_save(save_path, new_save_data, args.backup_dir)
+                logger.info(f"File saved successfully to {save_path}")
+    except (OSError, SaveFormatError, PlayerStateImportError) as e:
+        parser.exit(1, f"Error: {e}\n")
@@ -0,0 +1,135 @@
+import logging
+import os
+import re
+import shutil
+import struct
+import xml.etree.ElementTree as ET
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+HEADER_SIZE = 12
+
+# Attribute names the game writes are plain ASCII identifiers; a colon would need a namespace declaration
+ATTRIBUTE_NAME_PATTERN = re.compile(r"[^\W\d][\w.\-]*", re.ASCII)
+INVALID_VALUE_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class SaveFormatError(ValueError):
+    """Raised when a .save file cannot be decoded or re-encoded."""
+
+
+class ParsedSave:
+    """Decoded contents of a DYSMANTLE .save file, kept for a length-preserving rewrite."""
+    def __init__(self, header, decompressed_data, xml_start_index, xml_end_index, xml_root):
+        self.header = header
+        self.decompressed_data = decompressed_data
+        self.xml_start_index = xml_start_index
+        self.xml_end_index = xml_end_index
+        self.xml_root = xml_root
+
+    def player_state(self):
+        """Return the PLAYER_STATE array element, or None if the save has none."""
+        return find_player_state(self.xml_root)
+
+
+def find_player_state(xml_root):
+    """Return the PLAYER_STATE array element of a parsed save XML root, or None."""
+    return next((arr for arr in xml_root.findall('array') if arr.attrib.get('id') == 'PLAYER_STATE'), None)
+
+
+def validate_attribute(name, value):
+    """Raise SaveFormatError if an attribute name or value would serialize to invalid XML."""
+    if not isinstance(name, str) or not ATTRIBUTE_NAME_PATTERN.fullmatch(name):
+        raise SaveFormatError(f"Invalid attribute name: {name!r}")
+    if INVALID_VALUE_CHARS.search(value):
+        raise SaveFormatError(f"Invalid control character in value of {name}: {value!r}")
+
+
+def decode_save(raw_data):
+    """Decompress a raw .save file and parse its embedded XML block."""
+    if len(raw_data) < HEADER_SIZE:
+        raise SaveFormatError("File is too short for a valid .save file.")
+
+    header = raw_data[:HEADER_SIZE]
+    try:
+        decompressed_data = zlib.decompress(raw_data[HEADER_SIZE:])
+    except zlib.error as e:
+        logger.error(f"Decompression failed: {e}")
+        raise SaveFormatError(f"Save data could not be decompressed: {e}") from e
+
+    match = re.search(b"<\\?xml[^>]*>.*?</root>", decompressed_data, re.DOTALL)
+    if not match:
+        logger.error("Could not find valid XML in decompressed data.")
+        raise SaveFormatError("No valid XML found in save file.")
+
+    xml_bytes = match.group(0)
+    end_match = re.search(b"</root>", xml_bytes)
+    if not end_match:
+        logger.error("Could not find </root> in XML block.")
+        raise SaveFormatError("Invalid XML structure in save file.")
+
+    xml_bytes = xml_bytes[:end_match.end()]
+    xml_start_index = match.start()
+    xml_end_index = xml_start_index + len(xml_bytes)
+
+    try:
+        xml_root = ET.fromstring(xml_bytes)
+    except ET.ParseError as e:
+        logger.error(f"XML parsing failed: {e}")
+        raise SaveFormatError(f"Invalid XML in save file: {e}") from e
+    logger.debug(f"XML parsed successfully, length: {len(xml_bytes)}")
+
+    return ParsedSave(header, decompressed_data, xml_start_index, xml_end_index, xml_root)
+
+
+def splice_xml(decompressed_data, xml_start_index, xml_end_index, new_xml_bytes):
+    """Replace the XML block in the decompressed data, padding with spaces to keep its length."""
+    original_xml_length = xml_end_index - xml_start_index
+    if len(new_xml_bytes) < original_xml_length:
+        new_xml_bytes += b' ' * (original_xml_length - len(new_xml_bytes))
+
+    new_decompressed_data = (
+        decompressed_data[:xml_start_index] +
+        new_xml_bytes +
+        decompressed_data[xml_end_index:]
+    )
+
+    if len(new_decompressed_data) != len(decompressed_data):
+        logger.error(f"Decompressed data length mismatch: original={len(decompressed_data)}, new={len(new_decompressed_data)}")
+        raise SaveFormatError("Decompressed data length mismatch.")
+    return new_decompressed_data
+
+
+def compress_save(header, decompressed_data):
+    """Compress decompressed save data and prefix it with an updated header."""
+    new_compressed_data = zlib.compress(decompressed_data, level=9)
+    new_header = bytearray(header[:HEADER_SIZE])
+    new_header[8:12] = struct.pack('<I', len(new_compressed_data))
+    return bytes(new_header) + new_compressed_data
+
+
+def encode_save(parsed):
+    """Serialize a ParsedSave back into raw .save file bytes."""
+    new_xml_bytes = ET.tostring(parsed.xml_root, encoding='iso-8859-1')
+    new_decompressed_data = splice_xml(parsed.decompressed_data, parsed.xml_start_index, parsed.xml_end_index, new_xml_bytes)
+    return compress_save(parsed.header, new_decompressed_data)
+
+
+def backup_save(path, backup_dir):
+    """Copy a save into backup_dir under a timestamped name and return the backup path."""
+    os.makedirs(backup_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_path = os.path.join(backup_dir, f"{os.path.basename(path)}_{timestamp}.save")
+    shutil.copyfile(path, backup_path)
+    logger.info(f"Saved backup to {backup_path}")
+    return backup_path
+
+
+def write_save(path, data, backup_dir):
+    """Write save data to path, backing up any existing file first. Returns the backup path or None."""
+    backup_path = backup_save(path, backup_dir) if os.path.exists(path) else None
+    with open(path, 'wb') as f:
+        f.write(data)
+    return backup_path
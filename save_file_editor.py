@@ -1,13 +1,11 @@
 import logging
 import os
-import re
-import shutil
-import struct
 import tkinter as tk
-from datetime import datetime
 from tkinter import filedialog, messagebox, scrolledtext
 import xml.etree.ElementTree as ET
-import zlib
+
+from player_state_io import PlayerStateImportError, export_player_state, import_player_state
+from save_codec import HEADER_SIZE, SaveFormatError, backup_save, compress_save, decode_save, splice_xml
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -18,6 +16,13 @@ class SaveFileEditor:
         self.root = root
         self.root.title("Dysmantle Save File Editor")
         self.force_boolean_nodes = {"discovered_tower_areas"}
+        self.skip_ids = {
+            "active_stage", "last_death_position", "last_death_position_in_open_world",
+            "last_death_time_in_seconds_since_day1", "last_death_materials", "last_death_stage_id",
+            "last_location", "materials", "current_tower_area_id", "material_storage_alltime",
+            "tracked_recipes", "fast_travel", "states", "travel"
+        }
+        self.stage_values = ["stages/dlc1/index.xml", "stages/dlc2/index.xml", "stages/dlc3/index.xml", "stages/island/index.xml"]
         self.backup_dir = "backups"
         os.makedirs(self.backup_dir, exist_ok=True)
 
@@ -77,7 +82,11 @@ class SaveFileEditor:
         self.action_frame = tk.Frame(root)
         self.cancel_button = tk.Button(self.action_frame, text="Cancel", command=self.cancel_edit, padx=10, pady=5)
         self.save_button = tk.Button(self.action_frame, text="Save Changes", command=self.save_changes, state="disabled", padx=10, pady=5)
+        self.export_button = tk.Button(self.action_frame, text="Export PLAYER_STATE", command=self.export_player_state_file, padx=10, pady=5)
+        self.import_button = tk.Button(self.action_frame, text="Import PLAYER_STATE", command=self.import_player_state_file, padx=10, pady=5)
         self.cancel_button.pack(side="left", padx=5)
+        self.export_button.pack(side="left", padx=5)
+        self.import_button.pack(side="left", padx=5)
         self.save_button.pack(side="right", padx=5)
         self.action_frame.pack_forget()
 
@@ -96,49 +105,23 @@ class SaveFileEditor:
         try:
             with open(file_path, 'rb') as f:
                 raw_data = f.read()
-            if len(raw_data) < 12:
-                messagebox.showerror("Error", "File is too short for a valid .save file.")
-                return
-
-            header = raw_data[:12]
-            compressed_data = raw_data[12:]
-            decompressed_data = zlib.decompress(compressed_data)
-
-            match = re.search(b"<\?xml[^>]*>.*?</root>", decompressed_data, re.DOTALL)
-            if not match:
-                logger.error("Could not find valid XML in decompressed data.")
-                messagebox.showerror("Error", "No valid XML found in save file.")
-                return
-
-            xml_bytes = match.group(0)
-            end_match = re.search(b"</root>", xml_bytes)
-            if not end_match:
-                logger.error("Could not find </root> in XML block.")
-                messagebox.showerror("Error", "Invalid XML structure in save file.")
-                return
-
-            xml_bytes = xml_bytes[:end_match.end()]
-            self.xml_start_index = match.start()
-            self.xml_end_index = self.xml_start_index + len(xml_bytes)
-
             try:
-                self.xml_root = ET.fromstring(xml_bytes)
-                logger.debug(f"XML parsed successfully, length: {len(xml_bytes)}, parsed length: {len(ET.tostring(self.xml_root, encoding='iso-8859-1'))}")
-            except ET.ParseError as e:
-                logger.error(f"XML parsing failed: {e}")
-                messagebox.showerror("Error", f"Invalid XML in save file: {e}")
+                parsed = decode_save(raw_data)
+            except SaveFormatError as e:
+                messagebox.showerror("Error", str(e))
                 return
 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_path = os.path.join(self.backup_dir, f"{os.path.basename(file_path)}_{timestamp}.save")
-            shutil.copyfile(file_path, backup_path)
-            logger.info(f"Saved backup to {backup_path}")
+            self.xml_root = parsed.xml_root
+            self.xml_start_index = parsed.xml_start_index
+            self.xml_end_index = parsed.xml_end_index
+
+            backup_path = backup_save(file_path, self.backup_dir)
 
             self.original_binary_data = raw_data
-            self.original_decompressed_data = decompressed_data
-            self.original_compressed_data = compressed_data
+            self.original_decompressed_data = parsed.decompressed_data
+            self.original_compressed_data = raw_data[HEADER_SIZE:]
 
-            player_state = next((arr for arr in self.xml_root.findall('array') if arr.attrib.get('id') == 'PLAYER_STATE'), None)
+            player_state = parsed.player_state()
             if player_state is None:
                 messagebox.showerror("Error", "PLAYER_STATE array not found in save file XML.")
                 return
@@ -183,23 +166,12 @@ class SaveFileEditor:
         scrollbar.pack(side="right", fill="y")
 
         self.player_state_widgets.clear()
-        skip_ids = {
-            "active_stage", "last_death_position", "last_death_position_in_open_world",
-            "last_death_time_in_seconds_since_day1", "last_death_materials", "last_death_stage_id",
-            "last_location", "materials", "current_tower_area_id", "material_storage_alltime",
-            "tracked_recipes", "fast_travel", "states", "travel"
-        }
-
-        def is_leave_position_node(n):
-            node_id = n.attrib.get("id", "")
-            return node_id.startswith("stages/") and "leave_position" in n.attrib
-
         inventory_slots = []
         tk.Frame(scrollable_frame, height=2).pack(fill="x")
 
         for node in player_state_node.findall('node'):
             node_id = node.attrib.get('id', '')
-            if not node_id or is_leave_position_node(node) or node_id in skip_ids or len(node.attrib) == 1:
+            if not self._is_editable_node(node_id, node.attrib):
                 continue
             if node_id.startswith("slot_"):
                 inventory_slots.append(node)
@@ -220,6 +192,13 @@ class SaveFileEditor:
         if inventory_slots:
             self._render_inventory_slots(scrollable_frame, inventory_slots)
 
+    def _is_editable_node(self, node_id, attrib):
+        """Return True if the editor shows widgets for a PLAYER_STATE node with these attributes."""
+        if not node_id or node_id in self.skip_ids or len(attrib) == 1:
+            return False
+        # stages/* leave_position nodes are left as they are
+        return not (node_id.startswith("stages/") and "leave_position" in attrib)
+
     def _render_material_storage_node(self, parent, node):
         """Render the material_storage node with quantity entries, remove buttons, and an add material section."""
         node_id = node.attrib.get('id', 'material_storage')
@@ -508,11 +487,10 @@ class SaveFileEditor:
             tk.Entry(subframe, textvariable=var).pack(side="left", fill="x", expand=True)
             loc_vars.append(var)
 
-        stage_values = ["stages/dlc1/index.xml", "stages/dlc2/index.xml", "stages/dlc3/index.xml", "stages/island/index.xml"]
-        stage = node.attrib.get("stage", stage_values[0])
+        stage = node.attrib.get("stage", self.stage_values[0])
         tk.Label(frame, text="Stage").pack(anchor="w")
         stage_var = tk.StringVar(value=stage)
-        tk.OptionMenu(frame, stage_var, *stage_values).pack(fill="x", pady=2)
+        tk.OptionMenu(frame, stage_var, *self.stage_values).pack(fill="x", pady=2)
 
         enabled_val = node.attrib.get("enabled", "0")
         enabled_var = tk.IntVar(value=int(enabled_val))
@@ -555,106 +533,194 @@ class SaveFileEditor:
         self.xml_text.pack_forget()
         self.upload_button.pack(pady=5)
 
-    def save_changes(self):
-        """Save changes to the PLAYER_STATE data back to a .save file."""
-        if not self.original_file_path or not self.original_binary_data:
-            messagebox.showerror("Error", "No file loaded to save.")
+    def export_player_state_file(self):
+        """Export every PLAYER_STATE node, including current edits, to a CSV or NDJSON file."""
+        if self.current_player_state_data is None:
+            messagebox.showerror("Error", "No PLAYER_STATE loaded for export.")
             return
-        if not self.current_player_state_data:
-            messagebox.showerror("Error", "No PLAYER_STATE loaded for saving.")
+        file_path = filedialog.asksaveasfilename(
+            title="Export PLAYER_STATE",
+            defaultextension=".csv",
+            filetypes=[("CSV Files", "*.csv"), ("NDJSON Files", "*.ndjson *.jsonl")]
+        )
+        if not file_path:
+            return
+
+        try:
+            if not self._apply_widget_values():
+                return
+            count = export_player_state(self.current_player_state_data, file_path)
+            messagebox.showinfo("Success", f"Exported {count} PLAYER_STATE nodes to:\n{file_path}")
+        except Exception as e:
+            logger.error(f"Error exporting PLAYER_STATE: {e}", exc_info=True)
+            messagebox.showerror("Error", f"Failed to export PLAYER_STATE: {e}")
+
+    def import_player_state_file(self):
+        """Apply an edited CSV or NDJSON export to PLAYER_STATE and refresh the editor."""
+        if self.current_player_state_data is None:
+            messagebox.showerror("Error", "No PLAYER_STATE loaded for import.")
+            return
+        file_path = filedialog.askopenfilename(
+            title="Import PLAYER_STATE",
+            filetypes=[("CSV Files", "*.csv"), ("NDJSON Files", "*.ndjson *.jsonl")]
+        )
+        if not file_path:
             return
 
         try:
-            # Update XML attributes from UI widgets
-            for node in self.xml_root.findall('.//node'):
-                node_id = node.attrib.get('id')
-                if not node_id:
+            if not self._apply_widget_values():
+                return
+            changed = import_player_state(self.current_player_state_data, file_path, validate=self._check_imported_node)
+            # Rebuild the widgets so save_changes writes the imported values back instead of the old ones
+            self.action_frame.pack_forget()
+            self.show_player_state_editor(self.current_player_state_data)
+        except PlayerStateImportError as e:
+            messagebox.showerror("Error", f"Import aborted: {e}")
+            return
+        except Exception as e:
+            logger.error(f"Error importing PLAYER_STATE: {e}", exc_info=True)
+            messagebox.showerror("Error", f"Failed to import PLAYER_STATE: {e}")
+            return
+        finally:
+            self.action_frame.pack(pady=10, anchor="e")
+
+        messagebox.showinfo("Success", f"Imported changes for {len(changed)} PLAYER_STATE nodes.\nClick Save Changes to write them to the save file.")
+
+    def _check_imported_node(self, node_id, attributes):
+        """Reject imported values that the editor widgets would rewrite on the next save."""
+        if not self._is_editable_node(node_id, {"id": node_id, **attributes}):
+            return
+
+        def reject(reason):
+            raise PlayerStateImportError(f"{node_id}: {reason} (the editor would change it on save)")
+
+        def is_int(value):
+            try:
+                int(value)
+                return True
+            except ValueError:
+                return False
+
+        if node_id.startswith("slot_"):
+            amount = attributes.get("amount")
+            if amount is None or not is_int(amount):
+                reject(f"amount must be an integer, got {amount!r}")
+            material = attributes.get("material")
+            if int(amount) != 0 and material not in self.all_materials[1:]:
+                reject(f"material must be one of the known materials, got {material!r}")
+            if int(amount) == 0 and material is not None:
+                reject("a slot with amount 0 cannot have a material")
+        elif node_id == "respawn":
+            loc_parts = attributes.get("location", "").split(",")
+            try:
+                if len(loc_parts) != 3:
+                    raise ValueError
+                [float(part) for part in loc_parts]
+            except ValueError:
+                reject(f"location must be three comma-separated numbers, got {attributes.get('location')!r}")
+            if attributes.get("enabled") not in ("0", "1"):
+                reject(f"enabled must be 0 or 1, got {attributes.get('enabled')!r}")
+            if "stage" not in attributes:
+                reject("stage is missing")
+        elif node_id in ("material_storage", "tower_area_level"):
+            valid_attrs = self.all_materials[1:] if node_id == "material_storage" else self.all_towers
+            for attr, value in attributes.items():
+                if attr not in valid_attrs:
+                    reject(f"unknown attribute {attr}")
+                if not is_int(value):
+                    reject(f"{attr} must be an integer, got {value!r}")
+                if node_id == "tower_area_level" and not 1 <= int(value) <= 3:
+                    reject(f"{attr} must be 1-3, got {value!r}")
+
+    def _apply_widget_values(self):
+        """Copy values from the editor widgets into the XML tree. Returns False if a value is invalid."""
+        for node in self.xml_root.findall('.//node'):
+            node_id = node.attrib.get('id')
+            if not node_id:
+                continue
+            keys_for_node = [key for key in self.player_state_widgets if key[0] == node_id]
+            
+            # For material_storage and tower_area_level, sync attributes with player_state_widgets
+            if node_id in ("material_storage", "tower_area_level"):
+                # Keep only attributes present in player_state_widgets (and id)
+                valid_attrs = self.all_materials if node_id == "material_storage" else self.all_towers
+                current_attrs = set(node.attrib.keys()) - {"id"}
+                widget_attrs = {key[1] for key in keys_for_node}
+                for attr in current_attrs:
+                    if attr not in widget_attrs:
+                        del node.attrib[attr]
+            
+            loc_x_var = self.player_state_widgets.get((node_id, "location_x"))
+            loc_y_var = self.player_state_widgets.get((node_id, "location_y"))
+            loc_z_var = self.player_state_widgets.get((node_id, "location_z"))
+            if loc_x_var and loc_y_var and loc_z_var:
+                try:
+                    x, y, z = loc_x_var.get(), loc_y_var.get(), loc_z_var.get()
+                    float(x), float(y), float(z)  # Validate as numbers
+                    node.attrib["location"] = ",".join([x, y, z])
+                except ValueError:
+                    logger.error(f"Invalid location values for {node_id}: x={x}, y={y}, z={z}")
+                    messagebox.showerror("Error", f"Invalid location values for {node_id}. Save aborted.")
+                    return False
+
+            for key in keys_for_node:
+                attr = key[1]
+                if attr in ("location_x", "location_y", "location_z"):
                     continue
-                keys_for_node = [key for key in self.player_state_widgets if key[0] == node_id]
-                
-                # For material_storage and tower_area_level, sync attributes with player_state_widgets
+                widget_var = self.player_state_widgets[key]
+                new_val = widget_var.get()
+                if attr == "material" and node_id.startswith("slot_"):
+                    amount_var = self.player_state_widgets.get((node_id, "amount"))
+                    amount_val = amount_var.get() if amount_var else "0"
+                    try:
+                        if amount_val == "0" or amount_val == "" or int(amount_val) == 0:
+                            if "material" in node.attrib:
+                                del node.attrib["material"]
+                            continue
+                    except ValueError:
+                        logger.error(f"Invalid amount for {node_id}: {amount_val}")
+                        messagebox.showerror("Error", f"Invalid amount for {node_id}. Save aborted.")
+                        return False
+                # For material_storage and tower_area_level, ensure valid attribute and integer value
                 if node_id in ("material_storage", "tower_area_level"):
-                    # Keep only attributes present in player_state_widgets (and id)
                     valid_attrs = self.all_materials if node_id == "material_storage" else self.all_towers
-                    current_attrs = set(node.attrib.keys()) - {"id"}
-                    widget_attrs = {key[1] for key in keys_for_node}
-                    for attr in current_attrs:
-                        if attr not in widget_attrs:
-                            del node.attrib[attr]
-                
-                loc_x_var = self.player_state_widgets.get((node_id, "location_x"))
-                loc_y_var = self.player_state_widgets.get((node_id, "location_y"))
-                loc_z_var = self.player_state_widgets.get((node_id, "location_z"))
-                if loc_x_var and loc_y_var and loc_z_var:
+                    if attr not in valid_attrs:
+                        logger.warning(f"Ignoring invalid attribute for {node_id}: {attr}")
+                        continue
                     try:
-                        x, y, z = loc_x_var.get(), loc_y_var.get(), loc_z_var.get()
-                        float(x), float(y), float(z)  # Validate as numbers
-                        node.attrib["location"] = ",".join([x, y, z])
+                        int(new_val)  # Validate as integer
+                        if node_id == "tower_area_level" and (int(new_val) < 1 or int(new_val) > 3):
+                            logger.error(f"Invalid level for {node_id}.{attr}: {new_val}")
+                            messagebox.showerror("Error", f"Level for {node_id}.{attr} must be 1-3. Save aborted.")
+                            return False
                     except ValueError:
-                        logger.error(f"Invalid location values for {node_id}: x={x}, y={y}, z={z}")
-                        messagebox.showerror("Error", f"Invalid location values for {node_id}. Save aborted.")
-                        return
+                        logger.error(f"Invalid value for {node_id}.{attr}: {new_val}")
+                        messagebox.showerror("Error", f"Invalid value for {node_id}.{attr}. Save aborted.")
+                        return False
+                node.attrib[attr] = str(new_val)
+        return True
 
-                for key in keys_for_node:
-                    attr = key[1]
-                    if attr in ("location_x", "location_y", "location_z"):
-                        continue
-                    widget_var = self.player_state_widgets[key]
-                    new_val = widget_var.get()
-                    if attr == "material" and node_id.startswith("slot_"):
-                        amount_var = self.player_state_widgets.get((node_id, "amount"))
-                        amount_val = amount_var.get() if amount_var else "0"
-                        try:
-                            if amount_val == "0" or amount_val == "" or int(amount_val) == 0:
-                                if "material" in node.attrib:
-                                    del node.attrib["material"]
-                                continue
-                        except ValueError:
-                            logger.error(f"Invalid amount for {node_id}: {amount_val}")
-                            messagebox.showerror("Error", f"Invalid amount for {node_id}. Save aborted.")
-                            return
-                    # For material_storage and tower_area_level, ensure valid attribute and integer value
-                    if node_id in ("material_storage", "tower_area_level"):
-                        valid_attrs = self.all_materials if node_id == "material_storage" else self.all_towers
-                        if attr not in valid_attrs:
-                            logger.warning(f"Ignoring invalid attribute for {node_id}: {attr}")
-                            continue
-                        try:
-                            int(new_val)  # Validate as integer
-                            if node_id == "tower_area_level" and (int(new_val) < 1 or int(new_val) > 3):
-                                logger.error(f"Invalid level for {node_id}.{attr}: {new_val}")
-                                messagebox.showerror("Error", f"Level for {node_id}.{attr} must be 1-3. Save aborted.")
-                                return
-                        except ValueError:
-                            logger.error(f"Invalid value for {node_id}.{attr}: {new_val}")
-                            messagebox.showerror("Error", f"Invalid value for {node_id}.{attr}. Save aborted.")
-                            return
-                    node.attrib[attr] = str(new_val)
-
-            # Serialize updated XML
-            new_xml_bytes = ET.tostring(self.xml_root, encoding='iso-8859-1')
-            original_xml_length = self.xml_end_index - self.xml_start_index
-            if len(new_xml_bytes) < original_xml_length:
-                new_xml_bytes += b' ' * (original_xml_length - len(new_xml_bytes))
-
-            # Rebuild decompressed data
-            new_decompressed_data = (
-                self.original_decompressed_data[:self.xml_start_index] +
-                new_xml_bytes +
-                self.original_decompressed_data[self.xml_end_index:]
-            )
+    def save_changes(self):
+        """Save changes to the PLAYER_STATE data back to a .save file."""
+        if not self.original_file_path or not self.original_binary_data:
+            messagebox.showerror("Error", "No file loaded to save.")
+            return
+        if not self.current_player_state_data:
+            messagebox.showerror("Error", "No PLAYER_STATE loaded for saving.")
+            return
 
-            # Verify decompressed data length
-            if len(new_decompressed_data) != len(self.original_decompressed_data):
-                logger.error(f"Decompressed data length mismatch: original={len(self.original_decompressed_data)}, new={len(new_decompressed_data)}")
-                messagebox.showerror("Error", "Decompressed data length mismatch. Save aborted.")
+        try:
+            if not self._apply_widget_values():
                 return
 
-            # Compress data and update header
-            new_compressed_data = zlib.compress(new_decompressed_data, level=9)
-            header = bytearray(self.original_binary_data[:12])
-            header[8:12] = struct.pack('<I', len(new_compressed_data))
-            new_save_data = bytes(header) + new_compressed_data
+            # Serialize updated XML and rebuild the compressed save
+            try:
+                new_xml_bytes = ET.tostring(self.xml_root, encoding='iso-8859-1')
+                new_decompressed_data = splice_xml(self.original_decompressed_data, self.xml_start_index, self.xml_end_index, new_xml_bytes)
+            except SaveFormatError as e:
+                messagebox.showerror("Error", f"{e} Save aborted.")
+                return
+            new_save_data = compress_save(self.original_binary_data[:HEADER_SIZE], new_decompressed_data)
 
             # Save file
             result = messagebox.askyesnocancel(
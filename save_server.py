@@ -0,0 +1,428 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from save_codec import SaveFormatError, decode_save, encode_save, validate_attribute, write_save
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+REQUEST_TIMEOUT = 30
+KEEP_ALIVE_TIMEOUT = 30
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+                408: "Request Timeout", 409: "Conflict", 413: "Payload Too Large", 415: "Unsupported Media Type",
+                500: "Internal Server Error", 501: "Not Implemented"}
+# Checking Host stops DNS-rebinding pages from reaching the server under their own domain name
+ALLOWED_HOSTS = {"localhost", "127.0.0.1", "[::1]"}
+
+
+class ApiError(Exception):
+    """Error returned to the client as a JSON body with the given HTTP status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class CachedSave:
+    """PLAYER_STATE attributes of a save held in memory, tagged with the on-disk state they came from.
+
+    The XML tree itself never leaves the worker processes: unpickling an
+    ElementTree on the event loop costs about as much as parsing it, while a
+    list of attribute dicts is cheap to transfer.
+    """
+    def __init__(self, stamp, raw_data, nodes):
+        self.stamp = stamp
+        self.raw_data = raw_data
+        self.nodes = nodes
+        self.index_by_id = {}
+        for index, attributes in enumerate(nodes):
+            self.index_by_id.setdefault(attributes.get("id"), index)
+        self.changed = set()
+
+    @property
+    def dirty(self):
+        return bool(self.changed)
+
+
+class SaveCache:
+    """Least-recently-used cache of parsed saves keyed by absolute path.
+
+    Entries with unsaved patches are never evicted, so the cache may grow past
+    max_entries until they are saved.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, path):
+        entry = self._entries.get(path)
+        if entry is not None:
+            self._entries.move_to_end(path)
+        return entry
+
+    def put(self, path, entry):
+        self._entries[path] = entry
+        self._entries.move_to_end(path)
+        excess = len(self._entries) - self.max_entries
+        if excess > 0:
+            clean_paths = [p for p, e in self._entries.items() if not e.dirty and p != path]
+            for evicted_path in clean_paths[:excess]:
+                del self._entries[evicted_path]
+
+    def discard(self, path):
+        self._entries.pop(path, None)
+
+
+def _os_error(e, path):
+    """Map a filesystem error on a client-supplied path to an ApiError."""
+    if isinstance(e, FileNotFoundError):
+        return ApiError(404, f"Save file not found: {path}")
+    if isinstance(e, PermissionError):
+        return ApiError(403, f"Permission denied: {path}")
+    if isinstance(e, IsADirectoryError):
+        return ApiError(400, f"Path is a directory: {path}")
+    return ApiError(400, f"Cannot access {path}: {e.strerror or e}")
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read(), _file_stamp(path)
+
+
+def _write_save(path, data, backup_dir):
+    """Write save data to path, backing up any existing file first."""
+    backup_path = write_save(path, data, backup_dir)
+    return backup_path, _file_stamp(path)
+
+
+def _decode_player_state(raw_data):
+    """Decode a save and return the attributes of its PLAYER_STATE nodes; runs in a worker process."""
+    player_state = decode_save(raw_data).player_state()
+    if player_state is None:
+        raise SaveFormatError("PLAYER_STATE array not found in save file XML.")
+    return [dict(node.attrib) for node in player_state.findall('node')]
+
+
+def _rebuild_save(raw_data, changed_nodes):
+    """Decode a save, replace the attributes of the given node indexes and re-encode it; runs in a worker process."""
+    parsed = decode_save(raw_data)
+    nodes = parsed.player_state().findall('node')
+    for index, attributes in changed_nodes.items():
+        nodes[index].attrib.clear()
+        nodes[index].attrib.update(attributes)
+    return encode_save(parsed)
+
+
+def _node_to_json(attributes):
+    return {"id": attributes.get("id", ""), "attributes": attributes}
+
+
+class SaveServer:
+    """Asyncio JSON API exposing load, query, patch and save operations on .save files."""
+    def __init__(self, pool, root, cache_size=16, backup_dir="backups"):
+        self.pool = pool
+        self.root = os.path.realpath(root)
+        self.cache = SaveCache(cache_size)
+        # Backups live under the root too, but clients may not read or overwrite them
+        self.backup_dir = os.path.realpath(os.path.join(self.root, backup_dir))
+        self._locks = {}
+        self.routes = {
+            ("GET", "/health"): self.handle_health,
+            ("POST", "/load"): self.handle_load,
+            ("POST", "/query"): self.handle_query,
+            ("POST", "/patch"): self.handle_patch,
+            ("POST", "/save"): self.handle_save,
+        }
+
+    @contextlib.asynccontextmanager
+    async def _path_lock(self, path):
+        """Serialize requests for one save; the lock is dropped once nobody holds or waits for it."""
+        holder = self._locks.setdefault(path, [asyncio.Lock(), 0])
+        holder[1] += 1
+        try:
+            async with holder[0]:
+                yield
+        finally:
+            holder[1] -= 1
+            if holder[1] == 0:
+                del self._locks[path]
+
+    async def _get_save(self, path):
+        """Return the cached save for path, decoding it in the process pool if missing or stale."""
+        loop = asyncio.get_running_loop()
+        try:
+            stamp = await loop.run_in_executor(None, _file_stamp, path)
+        except OSError as e:
+            raise _os_error(e, path)
+
+        entry = self.cache.get(path)
+        if entry is not None and entry.stamp == stamp:
+            return entry, True
+        if entry is not None and entry.dirty:
+            raise ApiError(409, f"{path} changed on disk after it was patched. "
+                                'Load it with "discard": true to drop the unsaved patches.')
+
+        try:
+            raw_data, stamp = await loop.run_in_executor(None, _read_file, path)
+        except OSError as e:
+            raise _os_error(e, path)
+        try:
+            nodes = await loop.run_in_executor(self.pool, _decode_player_state, raw_data)
+        except SaveFormatError as e:
+            raise ApiError(400, str(e))
+
+        entry = CachedSave(stamp, raw_data, nodes)
+        self.cache.put(path, entry)
+        logger.info(f"Decoded {path}")
+        return entry, False
+
+    def _resolve_path(self, value, field):
+        """Resolve a client-supplied path against the root directory, refusing anything outside it."""
+        if not isinstance(value, str) or not value:
+            raise ApiError(400, f"'{field}' must be a path string.")
+        path = os.path.realpath(os.path.join(self.root, value))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ApiError(403, f"'{field}' must be inside {self.root}")
+        if os.path.commonpath([self.backup_dir, path]) == self.backup_dir:
+            raise ApiError(403, f"'{field}' must not be inside the backup folder {self.backup_dir}")
+        return path
+
+    def _require_path(self, payload):
+        return self._resolve_path(payload.get("path"), "path")
+
+    async def handle_health(self, payload):
+        return {"status": "ok"}
+
+    async def handle_load(self, payload):
+        """Decode a save into the cache; 'discard': true drops any unsaved patches first."""
+        path = self._require_path(payload)
+        async with self._path_lock(path):
+            if payload.get("discard") is True:
+                self.cache.discard(path)
+            entry, cached = await self._get_save(path)
+            return {"path": path, "cached": cached, "dirty": entry.dirty,
+                    "nodes": len(entry.nodes)}
+
+    async def handle_query(self, payload):
+        path = self._require_path(payload)
+        ids = payload.get("ids")
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, str) for i in ids)):
+            raise ApiError(400, "'ids' must be a list of node id strings.")
+        async with self._path_lock(path):
+            entry, _ = await self._get_save(path)
+            nodes = entry.nodes
+            if ids is not None:
+                wanted = set(ids)
+                nodes = [attributes for attributes in nodes if attributes.get("id") in wanted]
+            return {"path": path, "dirty": entry.dirty, "nodes": [_node_to_json(attributes) for attributes in nodes]}
+
+    async def handle_patch(self, payload):
+        """Apply {node_id: {attr: value}} changes; a null value removes the attribute."""
+        path = self._require_path(payload)
+        changes = payload.get("nodes")
+        if not isinstance(changes, dict) or not changes:
+            raise ApiError(400, "Request must include a non-empty 'nodes' object.")
+
+        async with self._path_lock(path):
+            entry, _ = await self._get_save(path)
+            # Validate everything before touching the cache so a bad patch applies nothing
+            for node_id, attrs in changes.items():
+                if node_id not in entry.index_by_id:
+                    raise ApiError(404, f"PLAYER_STATE node not found: {node_id}")
+                if not isinstance(attrs, dict):
+                    raise ApiError(400, f"Changes for {node_id} must be an object.")
+                for attr, value in attrs.items():
+                    if attr == "id":
+                        raise ApiError(400, f"Cannot change the id of {node_id}.")
+                    if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int, float))):
+                        raise ApiError(400, f"Invalid value for {node_id}.{attr}: {value!r}")
+                    if value is None:
+                        continue
+                    try:
+                        validate_attribute(attr, str(value))
+                    except SaveFormatError as e:
+                        raise ApiError(400, f"{node_id}: {e}")
+
+            for node_id, attrs in changes.items():
+                index = entry.index_by_id[node_id]
+                attributes = entry.nodes[index]
+                for attr, value in attrs.items():
+                    if value is None:
+                        if attributes.pop(attr, None) is not None:
+                            entry.changed.add(index)
+                    elif attributes.get(attr) != str(value):
+                        attributes[attr] = str(value)
+                        entry.changed.add(index)
+            return {"path": path, "nodes": [_node_to_json(entry.nodes[entry.index_by_id[node_id]]) for node_id in changes]}
+
+    async def handle_save(self, payload):
+        """Write the cached save to 'output' (default: overwrite 'path'), re-encoding it in the process pool."""
+        path = self._require_path(payload)
+        output = payload.get("output")
+        save_path = self._resolve_path(output, "output") if output is not None else path
+
+        loop = asyncio.get_running_loop()
+        async with self._path_lock(path):
+            entry, _ = await self._get_save(path)
+            changed_nodes = {index: entry.nodes[index] for index in entry.changed}
+            try:
+                new_save_data = await loop.run_in_executor(self.pool, _rebuild_save, entry.raw_data, changed_nodes)
+            except SaveFormatError as e:
+                raise ApiError(400, f"{e} Save aborted.")
+
+            try:
+                backup_path, stamp = await loop.run_in_executor(None, _write_save, save_path, new_save_data, self.backup_dir)
+            except OSError as e:
+                raise _os_error(e, save_path)
+            if save_path == path:
+                # The file on disk now matches the cached nodes, so keep them warm for further patches
+                entry.raw_data = new_save_data
+                entry.stamp = stamp
+                entry.changed.clear()
+            logger.info(f"File saved successfully to {save_path}")
+            return {"path": save_path, "backup": backup_path, "bytes": len(new_save_data)}
+
+    async def _read_request(self, reader, first_byte):
+        """Read the rest of an HTTP/1.1 request whose first byte has already arrived."""
+        request_line = first_byte + await reader.readline()
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise ApiError(400, "Malformed request line.")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'transfer-encoding' in headers:
+            raise ApiError(501, "Transfer-Encoding is not supported; send a Content-Length.")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ApiError(400, "Invalid Content-Length header.")
+        if length < 0:
+            raise ApiError(400, "Invalid Content-Length header.")
+        if length > MAX_BODY_SIZE:
+            raise ApiError(413, "Request body too large.")
+        body = await reader.readexactly(length) if length else b''
+        keep_alive = version == "HTTP/1.1" and headers.get('connection', '').lower() != 'close'
+        return method, target.split('?', 1)[0], headers, body, keep_alive
+
+    @staticmethod
+    def _check_headers(method, headers):
+        """Reject requests a web page in the user's browser could forge."""
+        host = headers.get('host', '').lower()
+        if not host.startswith('['):
+            host = host.rsplit(':', 1)[0]
+        elif ']' in host:
+            host = host[:host.index(']') + 1]
+        if host not in ALLOWED_HOSTS:
+            raise ApiError(403, "Host header must be localhost or a loopback address.")
+        # Browsers send cross-origin POSTs without a preflight only for form-style content types
+        content_type = headers.get('content-type', '').split(';', 1)[0].strip().lower()
+        if method == "POST" and content_type != "application/json":
+            raise ApiError(415, "Content-Type must be application/json.")
+
+    async def _dispatch(self, method, target, headers, body):
+        self._check_headers(method, headers)
+        handler = self.routes.get((method, target))
+        if handler is None:
+            if any(route_target == target for _, route_target in self.routes):
+                raise ApiError(405, f"Method {method} not allowed for {target}")
+            raise ApiError(404, f"Unknown endpoint: {target}")
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError as e:
+            raise ApiError(400, f"Invalid JSON body: {e}")
+        if not isinstance(payload, dict):
+            raise ApiError(400, "JSON body must be an object.")
+        return await handler(payload)
+
+    @staticmethod
+    async def _write_response(writer, status, result, keep_alive):
+        body = json.dumps(result).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                # An idle keep-alive connection is closed quietly; only a half-sent request gets a 408
+                try:
+                    first_byte = await asyncio.wait_for(reader.read(1), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not first_byte:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, first_byte), REQUEST_TIMEOUT)
+                    method, target, headers, body, keep_alive = request
+                    status, result = 200, await self._dispatch(method, target, headers, body)
+                except ApiError as e:
+                    status, result = e.status, {"error": e.message}
+                except asyncio.TimeoutError:
+                    status, result = 408, {"error": "Request timed out."}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    logger.error(f"Error handling request: {e}", exc_info=True)
+                    status, result = 500, {"error": str(e)}
+                await self._write_response(writer, status, result, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port, workers, cache_size, backup_dir, root):
+    # Forked workers would inherit open client sockets, so closing a connection in this process would not send EOF
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        save_server = SaveServer(pool, root, cache_size=cache_size, backup_dir=backup_dir)
+        server = await asyncio.start_server(save_server.handle_connection, host, port)
+        logger.info(f"Serving save editor API on http://{host}:{port} for saves under {save_server.root}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local JSON API server for editing DYSMANTLE .save files.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)),
+                        help="Process pool size for decompress/parse/compress")
+    parser.add_argument("--cache-size", type=int, default=16, help="Number of parsed saves kept in memory")
+    parser.add_argument("--backup-dir", default="backups",
+                        help="Folder for backups made before overwriting, relative to --root (default: backups)")
+    parser.add_argument("--root", default=os.getcwd(),
+                        help="Directory that all save paths must be inside; relative paths are resolved against it (default: current directory)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_size, args.backup_dir, args.root))
+    except KeyboardInterrupt:
+        logger.info("Server stopped")